@@ -29,4 +29,13 @@ REDETECTION_INTERVAL_MS = 200
 MISSED_DETECTIONS_UNTIL_LOST = 10
 
 CONFIDENCE_INTERVAL = 0.6
+
+# Skip cv2.imshow/cv2.waitKey, e.g. on servers without a display.
+HEADLESS = False
+
+# Serve an MJPEG preview, metrics and the s/d commands over HTTP.
+PREVIEW_SERVER_ENABLED = False
+PREVIEW_SERVER_HOST = "127.0.0.1"
+PREVIEW_SERVER_PORT = 8080
+PREVIEW_JPEG_QUALITY = 80
 # --------------------- Things that can be changed ---------------------
@@ -1,7 +1,9 @@
 import cv2
 import sys
 import os
+from typing import Optional
 from utils.opencv import (
+    clip_bbox,
     get_bounding_box_roi,
     get_points_from_bbox,
     get_tracker,
@@ -21,23 +23,87 @@ from constants import (
     DETECTOR_INTEREST_LABEL,
     REDETECTION_INTERVAL_MS,
     CONFIDENCE_INTERVAL,
+    HEADLESS,
+    PREVIEW_SERVER_ENABLED,
+    PREVIEW_SERVER_HOST,
+    PREVIEW_SERVER_PORT,
+    PREVIEW_JPEG_QUALITY,
 )
 from utils.opencv_window import display_default_info_on_frame, display_additional_labels
+from utils.preview_server import PreviewServer
 from ultralytics import YOLO
 
 (MAJOR_VER, MINOR_VER, SUBMINOR_VER) = (cv2.__version__).split(".")
 
 
 # ----------------------------------------------------------------------
+def select_bounding_box(frame, headless: bool, preview_server: Optional[PreviewServer]):
+    """
+    Asks the user for a bounding box, through the ROI window or, when running headless,
+    through POST /command/select on the preview server.
+    """
+    if not headless:
+        return get_bounding_box_roi(frame=frame)
+    if preview_server is None:
+        print("Cannot select a bounding box when headless without the preview server")
+        sys.exit()
+    preview_server.publish_frame(frame)
+    while True:
+        print("Waiting for a bounding box: POST /command/select?bbox=x,y,w,h")
+        selected_bbox = preview_server.wait_for_selection()
+        if selected_bbox is None:
+            sys.exit()
+        bbox = clip_bbox(bbox=selected_bbox, frame_shape=frame.shape)
+        if bbox is not None:
+            return bbox
+        print("Selected bbox is outside the frame")
+
+
 def main(
     detection_interval: int,
     redetection_interval_ms: int,
     missed_detections_until_lost: int,
     confidence_interval: float,
     only_detection: bool = False,
+    headless: bool = False,
+    preview_server_enabled: bool = False,
+):
+    preview_server = None
+    if preview_server_enabled:
+        preview_server = PreviewServer(
+            host=PREVIEW_SERVER_HOST,
+            port=PREVIEW_SERVER_PORT,
+            jpeg_quality=PREVIEW_JPEG_QUALITY,
+        )
+        preview_server.start()
+
+    # Also stops the server on sys.exit() and Ctrl-C.
+    try:
+        track(
+            detection_interval=detection_interval,
+            redetection_interval_ms=redetection_interval_ms,
+            missed_detections_until_lost=missed_detections_until_lost,
+            confidence_interval=confidence_interval,
+            only_detection=only_detection,
+            headless=headless,
+            preview_server=preview_server,
+        )
+    finally:
+        if preview_server is not None:
+            preview_server.stop()
+
+
+def track(
+    detection_interval: int,
+    redetection_interval_ms: int,
+    missed_detections_until_lost: int,
+    confidence_interval: float,
+    only_detection: bool,
+    headless: bool,
+    preview_server: Optional[PreviewServer],
 ):
     if only_detection:
-        test_yolo_v8_only()
+        test_yolo_v8_only(headless=headless, preview_server=preview_server)
 
     detection_interval_orig = detection_interval
 
@@ -85,7 +151,9 @@ def main(
             p, l, _ = p_local, l_local, v_local
         else:
             # Get user selection.
-            bbox = get_bounding_box_roi(frame=frame)
+            bbox = select_bounding_box(
+                frame=frame, headless=headless, preview_server=preview_server
+            )
 
         addit_labels[1] = f"Found {class_name} ({p_local:.2f}): {v_local}s"
         addit_labels_c[1] = DEFAULT_COLOR if object_match else ALARM_COLOR
@@ -93,7 +161,9 @@ def main(
     else:
         addit_labels[1] = "Inital bbox was not found by Yolov8."
         addit_labels_c[1] = ALARM_COLOR
-        bbox = get_bounding_box_roi(frame=frame)
+        bbox = select_bounding_box(
+            frame=frame, headless=headless, preview_server=preview_server
+        )
 
     # Initialize tracker with first frame and bounding box
     tracker.init(image=frame, boundingBox=bbox)
@@ -125,6 +195,8 @@ def main(
             if result is not None:
                 bbox_local, mt_local = result
                 p_local, l_local, v_local = mt_local
+                if preview_server is not None:
+                    preview_server.update_metrics(detection_latency_seconds=v_local)
                 class_name = get_name_from_class_id(model=detector, class_id=l_local)
                 object_match = l_local == DETECTOR_INTEREST_LABEL and p_local >= confidence_interval
                 if object_match:
@@ -186,6 +258,8 @@ def main(
                 addit_labels_c=addit_labels_c,
             )
         else:
+            # Keep the FPS metric current while only the detector runs.
+            fps = cv2.getTickFrequency() / (cv2.getTickCount() - timer)
             cv2.putText(
                 frame,
                 f"Object is lost ({round(time.time() - lost_timer, 2)}s)",
@@ -197,18 +271,52 @@ def main(
             )
 
         # Display result
-        cv2.imshow("Tracking", frame)
-
-        k = cv2.waitKey(1) & 0xFF
-
+        if preview_server is not None:
+            preview_server.update_metrics(
+                fps=fps,
+                object_lost=int(object_is_lost),
+                missed_detections=missed_detections_counter,
+            )
+            preview_server.publish_frame(frame)
+
+        command, selected_bbox = None, None
+        if not headless:
+            cv2.imshow("Tracking", frame)
+
+            k = cv2.waitKey(1) & 0xFF
+            if k == ord("s"):
+                command = "select"
+            elif k == ord("d"):
+                command = "detect"
+            # Exit if ESC pressed
+            elif k == 27:
+                command = "quit"
+        if command is None and preview_server is not None:
+            polled = preview_server.poll_command()
+            if polled is not None:
+                command, selected_bbox = polled
+
+        if command == "quit":
+            break
         # s - manual select
-        if k == ord("s"):
+        elif command == "select":
             # Allow re-selection of bounding box.
-            bbox = get_bounding_box_roi(frame=frame_copy)
+            selected_bbox = clip_bbox(
+                bbox=selected_bbox or get_bounding_box_roi(frame=frame_copy),
+                frame_shape=frame.shape,
+            )
 
-            # Reinit-tracker
-            tracker.init(image=frame, boundingBox=bbox)
-        elif k == ord("d"):
+            # Reinit-tracker, a bad selection must not stop tracking.
+            try:
+                if selected_bbox is None:
+                    raise ValueError("Selected bbox is outside the frame.")
+                tracker.init(image=frame, boundingBox=selected_bbox)
+                bbox = selected_bbox
+            except (ValueError, cv2.error) as e:
+                print(f"Could not re-init tracker: {e}")
+                addit_labels[1] = "Selected bbox was rejected."
+                addit_labels_c[1] = ALARM_COLOR
+        elif command == "detect":
             result = get_bounding_box_yolo_v8(frame=frame_copy, detector=detector)
 
             # Reset timer:
@@ -216,6 +324,8 @@ def main(
             if result is not None:
                 bbox_local, mt_local = result
                 p_local, l_local, v_local = mt_local
+                if preview_server is not None:
+                    preview_server.update_metrics(detection_latency_seconds=v_local)
                 class_name = get_name_from_class_id(model=detector, class_id=l_local)
                 object_match = l_local == DETECTOR_INTEREST_LABEL and p_local >= confidence_interval
                 if object_match:
@@ -231,10 +341,6 @@ def main(
                 addit_labels[1] = f"No Object detected ({missed_detections_counter})"
                 addit_labels_c[1] = ALARM_COLOR
 
-        # Exit if ESC pressed
-        elif k == 27:
-            break
-
 
 if __name__ == "__main__":
     main(
@@ -243,4 +349,6 @@ if __name__ == "__main__":
         missed_detections_until_lost=MISSED_DETECTIONS_UNTIL_LOST,
         confidence_interval=CONFIDENCE_INTERVAL,
         only_detection=ONLY_DETECTION,
+        headless=HEADLESS,
+        preview_server_enabled=PREVIEW_SERVER_ENABLED,
     )
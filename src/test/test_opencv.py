@@ -0,0 +1,17 @@
+from utils.opencv import clip_bbox
+
+FRAME_SHAPE = (480, 640, 3)
+
+
+def test_clip_bbox_inside_frame():
+    assert clip_bbox(bbox=(10, 20, 30, 40), frame_shape=FRAME_SHAPE) == (10, 20, 30, 40)
+
+
+def test_clip_bbox_partly_outside_frame():
+    assert clip_bbox(bbox=(-5, 10, 20, 1000), frame_shape=FRAME_SHAPE) == (0, 10, 15, 470)
+    assert clip_bbox(bbox=(630, 470, 50, 50), frame_shape=FRAME_SHAPE) == (630, 470, 10, 10)
+
+
+def test_clip_bbox_outside_frame():
+    assert clip_bbox(bbox=(99999, 99999, 10, 10), frame_shape=FRAME_SHAPE) is None
+    assert clip_bbox(bbox=(-20, 0, 10, 10), frame_shape=FRAME_SHAPE) is None
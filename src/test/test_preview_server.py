@@ -0,0 +1,304 @@
+import json
+import socket
+import urllib.error
+import urllib.request
+import cv2
+import numpy as np
+import pytest
+from utils import preview_server
+from utils.preview_server import PreviewServer
+
+
+@pytest.fixture
+def server():
+    server = PreviewServer(port=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def make_frame(value: int):
+    return np.full((8, 8, 3), value, dtype=np.uint8)
+
+
+def request(server: PreviewServer, path: str, method: str = "GET", body: bytes = None):
+    """
+    Sends a request to the server and returns (status, content type, body), also for error statuses.
+    """
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{server.port}{path}", data=body, method=method
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=5) as response:
+            return response.status, response.headers["Content-Type"], response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers["Content-Type"], e.read()
+
+
+def raw_request(server: PreviewServer, data: bytes) -> bytes:
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as sock:
+        sock.sendall(data)
+        return sock.makefile("rb").read()
+
+
+def count_encodes(server: PreviewServer) -> list:
+    encoded = []
+    encode = server._encode
+
+    def counting_encode(frame):
+        encoded.append(int(frame[0, 0, 0]))
+        return encode(frame)
+
+    server._encode = counting_encode
+    return encoded
+
+
+def read_part(stream) -> bytes:
+    """
+    Reads one multipart/x-mixed-replace part and returns its JPEG payload.
+    """
+    assert stream.readline() == b"--frame\r\n"
+    headers = {}
+    while True:
+        line = stream.readline().decode().strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.lower()] = value.strip()
+    assert headers["content-type"] == "image/jpeg"
+    jpeg = stream.read(int(headers["content-length"]))
+    assert stream.readline() == b"\r\n"
+    return jpeg
+
+
+def decode_value(jpeg: bytes) -> int:
+    frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return int(frame[0, 0, 0])
+
+
+def test_frame_404_until_published(server):
+    status, _, _ = request(server, "/frame.jpg")
+    assert status == 404
+
+    server.publish_frame(make_frame(100))
+    status, content_type, body = request(server, "/frame.jpg")
+    assert status == 200
+    assert content_type == "image/jpeg"
+    assert abs(decode_value(body) - 100) <= 2
+
+
+def test_frame_encoded_once_per_frame(server):
+    encoded = count_encodes(server)
+    server.publish_frame(make_frame(10))
+    for _ in range(3):
+        assert request(server, "/frame.jpg")[0] == 200
+    server.publish_frame(make_frame(20))
+    for _ in range(3):
+        assert request(server, "/frame.jpg")[0] == 200
+    assert encoded == [10, 20]
+
+
+def test_frames_not_encoded_without_clients(server):
+    encoded = count_encodes(server)
+    for value in range(5):
+        server.publish_frame(make_frame(value))
+    assert encoded == []
+    assert server.get_metrics()["frames_total"] == 5
+
+
+def test_stream_sends_one_part_per_frame(server):
+    encoded = count_encodes(server)
+    server.publish_frame(make_frame(0))
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as sock:
+        sock.sendall(b"GET /stream HTTP/1.1\r\n\r\n")
+        stream = sock.makefile("rb")
+        assert stream.readline() == b"HTTP/1.1 200 OK\r\n"
+        while stream.readline() != b"\r\n":
+            pass
+
+        # The latest frame is sent right away, then one part per published frame.
+        values = [decode_value(read_part(stream))]
+        for value in (50, 100, 150):
+            server.publish_frame(make_frame(value))
+            values.append(decode_value(read_part(stream)))
+
+    assert [round(v, -1) for v in values] == [0, 50, 100, 150]
+    assert encoded == [0, 50, 100, 150]
+
+
+def test_metrics(server):
+    server.update_metrics(
+        fps=29.5, detection_latency_seconds=0.15, object_lost=1, missed_detections=3
+    )
+    server.publish_frame(make_frame(0))
+
+    status, content_type, body = request(server, "/metrics.json")
+    assert status == 200
+    assert content_type == "application/json"
+    assert json.loads(body) == {
+        "fps": 29.5,
+        "detection_latency_seconds": 0.15,
+        "object_lost": 1,
+        "missed_detections": 3,
+        "frames_total": 1,
+    }
+
+    status, content_type, body = request(server, "/metrics")
+    assert status == 200
+    assert content_type.startswith("text/plain")
+    lines = body.decode().splitlines()
+    assert "# TYPE tracker_fps gauge" in lines
+    assert "tracker_fps 29.5" in lines
+    assert "tracker_object_lost 1" in lines
+    assert "# TYPE tracker_frames_total counter" in lines
+    assert "tracker_frames_total 1" in lines
+
+
+def test_unknown_metric(server):
+    with pytest.raises(ValueError):
+        server.update_metrics(latency=1)
+
+
+def test_commands(server):
+    assert server.poll_command() is None
+
+    status, _, body = request(server, "/command/detect", method="POST", body=b"")
+    assert status == 202
+    assert json.loads(body) == {"command": "detect", "bbox": None}
+
+    status, _, _ = request(
+        server, "/command/select?bbox=1,2,30,40", method="POST", body=b""
+    )
+    assert status == 202
+
+    status, _, _ = request(
+        server,
+        "/command/select",
+        method="POST",
+        body=json.dumps({"bbox": [5, 6, 7, 8]}).encode(),
+    )
+    assert status == 202
+
+    status, _, _ = request(server, "/command/quit", method="POST", body=b"")
+    assert status == 202
+
+    assert server.poll_command() == ("detect", None)
+    assert server.poll_command() == ("select", (1, 2, 30, 40))
+    assert server.poll_command() == ("select", (5, 6, 7, 8))
+    assert server.poll_command() == ("quit", None)
+    assert server.poll_command() is None
+
+
+def test_disabled_commands(server):
+    server.set_enabled_commands("quit")
+    for name in ("detect", "select?bbox=1,2,3,4"):
+        assert request(server, f"/command/{name}", method="POST", body=b"")[0] == 409
+    assert request(server, "/command/quit", method="POST", body=b"")[0] == 202
+    assert server.poll_command() == ("quit", None)
+    assert server.poll_command() is None
+
+    server.set_enabled_commands()
+    assert request(server, "/command/detect", method="POST", body=b"")[0] == 202
+
+    with pytest.raises(ValueError):
+        server.set_enabled_commands("nope")
+
+
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/command/select", b""),
+        ("/command/select?bbox=1,2,3", b""),
+        ("/command/select?bbox=1,2,0,4", b""),
+        ("/command/select?bbox=a,b,c,d", b""),
+        ("/command/select", b"not json"),
+        ("/command/select", b'{"bbox": null}'),
+        ("/command/select?bbox=inf,0,1,1", b""),
+        ("/command/select", b'{"bbox": [1e400, 0, 1, 1]}'),
+        ("/command/select", b'{"bbox": "1234"}'),
+        ("/command/select", b'{"bbox": [1, 2, 3, 4, 5]}'),
+    ],
+)
+def test_select_invalid_bbox(server, path, body):
+    status, _, _ = request(server, path, method="POST", body=body)
+    assert status == 400
+    assert server.poll_command() is None
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"garbage\r\n\r\n",
+        b"POST /command/detect HTTP/1.1\r\nContent-Length: -5\r\n\r\n",
+        b"POST /command/detect HTTP/1.1\r\nContent-Length: 100000\r\n\r\n",
+        b"POST /command/detect HTTP/1.1\r\nContent-Length: five\r\n\r\n",
+        b"GET /metrics HTTP/1.1\r\nX-Long: " + b"a" * 100_000 + b"\r\n\r\n",
+        b"GET /" + b"a" * 100_000 + b" HTTP/1.1\r\n\r\n",
+    ],
+)
+def test_malformed_request(server, data):
+    assert raw_request(server, data).startswith(b"HTTP/1.1 400 Bad Request\r\n")
+    assert server.poll_command() is None
+
+
+def test_idle_request_times_out(server, monkeypatch):
+    monkeypatch.setattr(preview_server, "REQUEST_TIMEOUT_SECONDS", 0.2)
+    # Never finishes the headers.
+    response = raw_request(server, b"GET /metrics HTTP/1.1\r\n")
+    assert response.startswith(b"HTTP/1.1 400 Bad Request\r\n")
+
+
+@pytest.mark.parametrize(
+    "path, method",
+    [
+        ("/nope", "GET"),
+        ("/command/nope", "POST"),
+    ],
+)
+def test_not_found(server, path, method):
+    assert request(server, path, method=method, body=b"")[0] == 404
+
+
+@pytest.mark.parametrize(
+    "path, method",
+    [
+        ("/stream", "POST"),
+        ("/frame.jpg", "POST"),
+        ("/metrics", "POST"),
+        ("/metrics.json", "DELETE"),
+        ("/command/detect", "GET"),
+    ],
+)
+def test_method_not_allowed(server, path, method):
+    body = b"" if method == "POST" else None
+    assert request(server, path, method=method, body=body)[0] == 405
+    assert server.poll_command() is None
+
+
+def test_stop_with_open_stream():
+    server = PreviewServer(port=0)
+    server.start()
+    server.publish_frame(make_frame(0))
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as sock:
+        sock.sendall(b"GET /stream HTTP/1.1\r\n\r\n")
+        stream = sock.makefile("rb")
+        assert stream.readline() == b"HTTP/1.1 200 OK\r\n"
+
+        server.stop()
+        assert server._thread is None
+        # Closing the stream ends it, after whatever was already sent.
+        stream.read()
+
+    with pytest.raises(OSError):
+        socket.create_connection(("127.0.0.1", server.port), timeout=1)
+    # Stopping twice is a no-op.
+    server.stop()
+
+
+def test_start_port_in_use():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        server = PreviewServer(port=sock.getsockname()[1])
+        with pytest.raises(OSError):
+            server.start()
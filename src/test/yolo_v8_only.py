@@ -2,11 +2,19 @@ from ultralytics import YOLO
 import cv2
 import os
 import sys
+from typing import Optional
 from constants import VIDEO_OF_INTEREST, ALARM_COLOR
 from utils.yolo import get_bounding_box_yolo_v8
+from utils.preview_server import PreviewServer
 
 
-def test_yolo_v8_only():
+def test_yolo_v8_only(
+    headless: bool = False, preview_server: Optional[PreviewServer] = None
+):
+    # Detection runs on every frame, there is nothing to select or force.
+    if preview_server is not None:
+        preview_server.set_enabled_commands("quit")
+
     detector = YOLO("yolov8n.pt")  # load a pretrained model (recommended for training)
     video_capture = cv2.VideoCapture(
         os.path.join("assets", "videos", VIDEO_OF_INTEREST)
@@ -36,7 +44,9 @@ def test_yolo_v8_only():
             frame=frame, detector=detector, xywh_format=False
         )
         if result is not None:
-            bbox, _ = result
+            bbox, metadata = result
+            if preview_server is not None:
+                preview_server.update_metrics(detection_latency_seconds=metadata[2])
             cv2.rectangle(
                 img=frame,
                 pt1=tuple(bbox[:2]),
@@ -55,7 +65,17 @@ def test_yolo_v8_only():
                 2,
             )
 
+        if preview_server is not None:
+            preview_server.publish_frame(frame)
+            polled = preview_server.poll_command()
+            if polled is not None and polled[0] == "quit":
+                break
+        if headless:
+            continue
         cv2.imshow("Detection YoloV8 Only", frame)
         k = cv2.waitKey(1) & 0xFF
         if k == 27:
             break
+
+    if preview_server is not None:
+        preview_server.set_enabled_commands()
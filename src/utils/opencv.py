@@ -1,4 +1,4 @@
-from typing import Tuple, List, Union
+from typing import Tuple, List, Optional, Union
 import cv2
 
 
@@ -58,6 +58,29 @@ def conv_xyxy_to_xywh(
     return (int(x1), int(y1), int(x2 - x1), int(y2 - y1))
 
 
+def clip_bbox(
+    bbox: Tuple[int, int, int, int], frame_shape: Tuple[int, ...]
+) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Clips a bounding box to the frame, e.g. before handing a user supplied bounding box to a tracker.
+
+    Parameters:
+        bbox (Tuple[int, int, int, int]): A tuple representing the bounding box coordinates in (x, y, width, height) format.
+        frame_shape (Tuple[int, ...]): The shape of the frame, (height, width[, channels]).
+
+    Returns:
+        Optional[Tuple[int, int, int, int]]: The clipped bounding box in (x, y, width, height) format,
+        or None if it does not overlap the frame.
+    """
+    frame_height, frame_width = frame_shape[:2]
+    x1, y1, x2, y2 = conv_xywh_to_xyxy(bbox=bbox)
+    x1, x2 = max(x1, 0), min(x2, frame_width)
+    y1, y2 = max(y1, 0), min(y2, frame_height)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return conv_xyxy_to_xywh(bbox=(x1, y1, x2, y2))
+
+
 def get_bounding_box_roi(frame) -> Tuple[int, int, int, int]:
     """
     Either uses a detector to get the bounding box of the current frame,
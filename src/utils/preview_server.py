@@ -0,0 +1,490 @@
+import asyncio
+import json
+import queue
+import threading
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import cv2
+
+BOUNDARY = "frame"
+
+# Commands carry at most a small JSON body.
+MAX_BODY_BYTES = 4096
+
+# Time a client gets to send its request, so idle connections cannot hold a handler.
+REQUEST_TIMEOUT_SECONDS = 10
+
+COMMANDS = ("select", "detect", "quit")
+
+# Metrics exposed on /metrics, with their Prometheus type and help text.
+METRICS = {
+    "fps": ("gauge", "Frames per second processed by the tracker."),
+    "detection_latency_seconds": ("gauge", "Duration of the last YOLOv8 detection."),
+    "object_lost": ("gauge", "1 if the object of interest is currently lost."),
+    "missed_detections": ("gauge", "Consecutive detections without a match."),
+    "frames_total": ("counter", "Frames published since the server started."),
+}
+
+REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+}
+
+
+class PreviewServer:
+    """
+    Local HTTP server that runs beside the pipeline in its own thread and asyncio loop.
+
+    Endpoints:
+        GET  /stream             MJPEG preview of the latest published frame.
+        GET  /frame.jpg          The latest published frame as a single JPEG.
+        GET  /metrics            Metrics in Prometheus text format.
+        GET  /metrics.json       Metrics as JSON.
+        POST /command/detect     Same as the 'd' key: force a detection.
+        POST /command/select     Same as the 's' key: re-init the tracker, requires
+                                 a bbox, e.g. ?bbox=x,y,w,h or {"bbox": [x, y, w, h]}.
+        POST /command/quit       Same as the ESC key: stop the pipeline.
+
+    Commands the pipeline cannot run at the moment (see `set_enabled_commands`) are
+    answered with 409 instead of being queued, e.g. only "quit" in ONLY_DETECTION mode.
+
+    The pipeline only stores a reference to each frame in `publish_frame`. JPEG
+    encoding happens on the server loop's executor, at most once per frame and only
+    when a client asks for it, so slow or absent clients never slow down tracking.
+
+    Parameters:
+        host (str): The interface to bind to.
+        port (int): The port to bind to, 0 picks a free port (see `port`).
+        jpeg_quality (int): JPEG quality (0-100) of the preview frames.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, jpeg_quality: int = 80):
+        self.host = host
+        self.port = port
+        self.jpeg_quality = jpeg_quality
+
+        self._lock = threading.Lock()
+        self._frame = None
+        self._frame_seq = 0
+        self._metrics: Dict[str, float] = {name: 0 for name in METRICS}
+        self._commands: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        self._enabled_commands: Tuple[str, ...] = COMMANDS
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._startup_error: Optional[BaseException] = None
+        self._new_frame: Optional[asyncio.Event] = None
+        self._encode_lock: Optional[asyncio.Lock] = None
+        self._jpeg: Tuple[int, Optional[bytes]] = (0, None)
+        self._stream_clients = 0
+
+    # ------------------------------------------------------------------
+    # Pipeline side (called from the main thread).
+
+    def start(self) -> None:
+        """
+        Starts the server thread and blocks until the socket is bound.
+
+        Raises:
+            OSError: If the server cannot bind, e.g. the port is already in use.
+        """
+        self._thread = threading.Thread(
+            target=self._run, name="preview-server", daemon=True
+        )
+        self._thread.start()
+        self._ready.wait()
+        if self._startup_error is not None:
+            self._thread.join()
+            self._thread = None
+            raise self._startup_error
+        print(f"Preview server listening on http://{self.host}:{self.port}")
+
+    def stop(self) -> None:
+        """
+        Stops the server loop and waits for the server thread to exit.
+        """
+        if self._loop is None or self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def publish_frame(self, frame) -> None:
+        """
+        Makes `frame` the latest preview frame. The frame must not be modified afterwards.
+
+        Parameters:
+            frame: The annotated frame.
+        """
+        with self._lock:
+            self._frame = frame
+            self._frame_seq += 1
+            self._metrics["frames_total"] = self._frame_seq
+        # Only wake the loop if someone is actually watching the stream.
+        if self._stream_clients and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._notify_new_frame)
+
+    def update_metrics(self, **metrics: float) -> None:
+        """
+        Updates one or more metrics, e.g. `update_metrics(fps=30, object_lost=0)`.
+
+        Raises:
+            ValueError: If a metric name is not known.
+        """
+        unknown = set(metrics) - set(METRICS)
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}.")
+        with self._lock:
+            self._metrics.update(metrics)
+
+    def set_enabled_commands(self, *commands: str) -> None:
+        """
+        Limits the commands the pipeline currently runs, others are answered with 409.
+
+        Parameters:
+            *commands (str): The enabled commands, all of COMMANDS if none are given.
+
+        Raises:
+            ValueError: If a command is not known.
+        """
+        unknown = set(commands) - set(COMMANDS)
+        if unknown:
+            raise ValueError(f"Unknown commands: {', '.join(sorted(unknown))}.")
+        self._enabled_commands = commands or COMMANDS
+
+    def poll_command(self) -> Optional[Tuple[str, Any]]:
+        """
+        Returns the oldest pending command without blocking.
+
+        Returns:
+            Optional[Tuple[str, Any]]: The command name ("select", "detect" or "quit") and its
+            payload (the (x, y, w, h) bbox for "select", None otherwise), or None if
+            there is no pending command.
+        """
+        try:
+            return self._commands.get_nowait()
+        except queue.Empty:
+            return None
+
+    def wait_for_selection(self) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Blocks until a "select" or "quit" command arrives, dropping any other pending
+        commands. Replaces the cv2.selectROI window when running headless.
+
+        Returns:
+            Optional[Tuple[int, int, int, int]]: The selected bounding box in (x, y, w, h)
+            format, or None if "quit" was requested.
+        """
+        while True:
+            name, payload = self._commands.get()
+            if name == "select":
+                return payload
+            if name == "quit":
+                return None
+
+    def get_metrics(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._metrics)
+
+    # ------------------------------------------------------------------
+    # Server side (runs in the server thread).
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._new_frame = asyncio.Event()
+        self._encode_lock = asyncio.Lock()
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port)
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+        except Exception as e:
+            # Handed over to start(), which re-raises it in the calling thread.
+            self._startup_error = e
+            self._loop.close()
+            return
+        finally:
+            self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            # Open streams never finish on their own, cancel them before closing.
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(
+                asyncio.gather(*tasks, return_exceptions=True)
+            )
+            self._loop.close()
+
+    def _notify_new_frame(self) -> None:
+        # Wake everyone waiting on the current event and hand out a fresh one.
+        self._new_frame.set()
+        self._new_frame = asyncio.Event()
+
+    async def _get_jpeg(self) -> Tuple[int, Optional[bytes]]:
+        """
+        Returns the latest frame as JPEG, encoding it at most once per frame.
+        """
+        async with self._encode_lock:
+            with self._lock:
+                frame, seq = self._frame, self._frame_seq
+            if frame is None or self._jpeg[0] == seq:
+                return self._jpeg
+            jpeg = await self._loop.run_in_executor(None, self._encode, frame)
+            self._jpeg = (seq, jpeg)
+            return self._jpeg
+
+    def _encode(self, frame) -> Optional[bytes]:
+        ok, buffer = cv2.imencode(
+            ".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        )
+        return buffer.tobytes() if ok else None
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                await self._respond(writer, 400, b"Malformed request.\n")
+                return
+            method, path, query, body = request
+
+            if path == "/stream":
+                if method != "GET":
+                    await self._respond(writer, 405, b"Use GET.\n")
+                    return
+                await self._stream(writer)
+            elif path == "/frame.jpg":
+                if method != "GET":
+                    await self._respond(writer, 405, b"Use GET.\n")
+                    return
+                _, jpeg = await self._get_jpeg()
+                if jpeg is None:
+                    await self._respond(writer, 404, b"No frame published yet.\n")
+                else:
+                    await self._respond(writer, 200, jpeg, "image/jpeg")
+            elif path == "/metrics":
+                if method != "GET":
+                    await self._respond(writer, 405, b"Use GET.\n")
+                    return
+                await self._respond(
+                    writer,
+                    200,
+                    self._format_prometheus().encode(),
+                    "text/plain; version=0.0.4",
+                )
+            elif path == "/metrics.json":
+                if method != "GET":
+                    await self._respond(writer, 405, b"Use GET.\n")
+                    return
+                await self._respond(
+                    writer,
+                    200,
+                    json.dumps(self.get_metrics()).encode(),
+                    "application/json",
+                )
+            elif path.startswith("/command/"):
+                if method != "POST":
+                    await self._respond(writer, 405, b"Use POST.\n")
+                    return
+                await self._command(writer, path[len("/command/"):], query, body)
+            else:
+                await self._respond(writer, 404, b"Not found.\n")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Server is stopping.
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, list], bytes]]:
+        """
+        Reads the request, returns None if it is malformed, too long or not sent in time.
+        """
+        try:
+            return await asyncio.wait_for(
+                self._parse_request(reader), REQUEST_TIMEOUT_SECONDS
+            )
+        except (ValueError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+            # ValueError: readline() hit the stream limit (64 KiB) within one line.
+            return None
+
+    async def _parse_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, list], bytes]]:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            return None
+        method, target, _ = request_line
+
+        content_length = 0
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                try:
+                    content_length = int(value.strip())
+                except ValueError:
+                    return None
+                if not 0 <= content_length <= MAX_BODY_BYTES:
+                    return None
+        body = await reader.readexactly(content_length) if content_length else b""
+
+        url = urlsplit(target)
+        return method.upper(), url.path, parse_qs(url.query), body
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: bytes,
+        content_type: str = "text/plain",
+    ) -> None:
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Cache-Control: no-cache\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode()
+            + body
+        )
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter) -> None:
+        """
+        Sends frames as multipart/x-mixed-replace. Each client gets the latest frame
+        once the previous one has been written, so slow clients skip frames instead
+        of queueing them.
+        """
+        writer.write(
+            (
+                "HTTP/1.1 200 OK\r\n"
+                f"Content-Type: multipart/x-mixed-replace; boundary={BOUNDARY}\r\n"
+                "Cache-Control: no-cache\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode()
+        )
+        await writer.drain()
+
+        self._stream_clients += 1
+        last_seq = 0
+        try:
+            while True:
+                new_frame = self._new_frame
+                seq, jpeg = await self._get_jpeg()
+                if jpeg is None or seq == last_seq:
+                    await new_frame.wait()
+                    continue
+                last_seq = seq
+                writer.write(
+                    (
+                        f"--{BOUNDARY}\r\n"
+                        "Content-Type: image/jpeg\r\n"
+                        f"Content-Length: {len(jpeg)}\r\n\r\n"
+                    ).encode()
+                    + jpeg
+                    + b"\r\n"
+                )
+                await writer.drain()
+        finally:
+            self._stream_clients -= 1
+
+    async def _command(
+        self,
+        writer: asyncio.StreamWriter,
+        name: str,
+        query: Dict[str, list],
+        body: bytes,
+    ) -> None:
+        if name not in COMMANDS:
+            await self._respond(writer, 404, f"Unknown command {name!r}.\n".encode())
+            return
+        if name not in self._enabled_commands:
+            await self._respond(
+                writer, 409, f"Command {name!r} is not available right now.\n".encode()
+            )
+            return
+
+        payload = None
+        if name == "select":
+            payload = parse_bbox(query=query, body=body)
+            if payload is None:
+                await self._respond(
+                    writer,
+                    400,
+                    b"select requires a bbox: ?bbox=x,y,w,h or {\"bbox\": [x, y, w, h]}.\n",
+                )
+                return
+
+        self._commands.put((name, payload))
+        await self._respond(
+            writer,
+            202,
+            json.dumps({"command": name, "bbox": payload}).encode(),
+            "application/json",
+        )
+
+    def _format_prometheus(self) -> str:
+        lines = []
+        for name, value in self.get_metrics().items():
+            metric_type, help_text = METRICS[name]
+            lines.append(f"# HELP tracker_{name} {help_text}")
+            lines.append(f"# TYPE tracker_{name} {metric_type}")
+            lines.append(f"tracker_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def parse_bbox(
+    query: Dict[str, list], body: bytes
+) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Parses a bounding box in (x, y, w, h) format from the query string or a JSON body.
+
+    Parameters:
+        query (Dict[str, list]): The parsed query string.
+        body (bytes): The request body.
+
+    Returns:
+        Optional[Tuple[int, int, int, int]]: The bounding box, or None if it is missing or invalid.
+    """
+    if "bbox" in query:
+        values = query["bbox"][0].split(",")
+    elif body:
+        try:
+            values = json.loads(body).get("bbox")
+        except (ValueError, AttributeError):
+            return None
+        # A string would otherwise be unpacked character by character.
+        if not isinstance(values, list):
+            return None
+    else:
+        return None
+
+    if len(values) != 4:
+        return None
+    try:
+        x, y, w, h = (int(float(v)) for v in values)
+    except (TypeError, ValueError, OverflowError):
+        # OverflowError: inf or numbers too large for a float, e.g. 1e400.
+        return None
+    if w <= 0 or h <= 0:
+        return None
+    return (x, y, w, h)
+